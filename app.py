@@ -1,11 +1,14 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import plotly.graph_objects as go
 from fredapi import Fred
 from dotenv import load_dotenv
 import os
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
 
 # Load environment variables
 load_dotenv()
@@ -34,9 +37,14 @@ CPI_SERIES = {
     'Education and Communication': 'CPIEDUSL',
     'Other Goods and Services': 'CPIOGSSL'
 }
+CPI_SERIES_NAMES = list(CPI_SERIES.keys())
+
+# Define available view types
+VIEW_TYPES = ('Index Values', 'Year-over-Year Changes', 'Both')
+VIEW_INDEX = {view: i for i, view in enumerate(VIEW_TYPES)}
 
 # Define a consistent color palette
-COLOR_PALETTE = [
+COLOR_PALETTE = (
     '#1f77b4',  # blue
     '#ff7f0e',  # orange
     '#2ca02c',  # green
@@ -46,62 +54,94 @@ COLOR_PALETTE = [
     '#e377c2',  # pink
     '#7f7f7f',  # gray
     '#bcbd22',  # yellow-green
-]
+)
 
-def get_cpi_data(series_id, start_date, end_date):
-    """Fetch CPI data from FRED"""
-    try:
-        df = fred.get_series(series_id, observation_start=start_date, observation_end=end_date)
-        return pd.DataFrame(df, columns=['value'])
-    except Exception as e:
-        st.error(f"Error fetching data: {str(e)}")
-        return None
+# Maximum number of plotted points for unified hover
+UNIFIED_HOVER_MAX_POINTS = 5000
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def fetch_cpi_series(series_id, start_date, end_date):
+    """Fetch a CPI series from FRED, cached for a day"""
+    return fred.get_series(series_id, observation_start=start_date, observation_end=end_date)
+
+def get_cpi_data(selected_series, start_date, end_date):
+    """Fetch CPI data from FRED for all selected series concurrently"""
+    # Worker threads need the script run context to use the Streamlit cache
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=len(selected_series),
+        initializer=add_script_run_ctx,
+        initargs=(None, ctx)
+    ) as executor:
+        futures = {
+            series_name: executor.submit(fetch_cpi_series, CPI_SERIES[series_name], start_date, end_date)
+            for series_name in selected_series
+        }
+    
+    # Report errors from the main thread so they render in the app
+    series_dict = {}
+    for series_name, future in futures.items():
+        try:
+            series_dict[series_name] = future.result()
+        except Exception as e:
+            st.error(f"Error fetching data: {str(e)}")
+    return series_dict
 
 def calculate_yoy_change(df):
-    """Calculate year-over-year percentage change"""
-    return df['value'].pct_change(periods=12) * 100
+    """Calculate year-over-year percentage change for every series"""
+    return df.pct_change(periods=12, fill_method=None) * 100
 
-def create_plot(df_dict, view_type):
+def create_plot(combined_df, yoy_df, view_type):
     """Create interactive Plotly chart with multiple series"""
-    fig = go.Figure()
+    traces = []
     
-    # Get color for each series
-    series_colors = {series: COLOR_PALETTE[i % len(COLOR_PALETTE)] 
-                    for i, series in enumerate(df_dict.keys())}
+    # Get color for each series, shared by index and YoY traces
+    colors = list(islice(cycle(COLOR_PALETTE), len(combined_df.columns)))
     
     if view_type in ['Index Values', 'Both']:
         # Add absolute values
-        for series_name, df in df_dict.items():
-            fig.add_trace(go.Scatter(
-                x=df.index,
-                y=df['value'],
+        index_dash = 'dot' if view_type == 'Both' else 'solid'
+        for i, (series_name, values) in enumerate(combined_df.items()):
+            traces.append(go.Scattergl(
+                x=combined_df.index,
+                y=values,
                 name=f'{series_name} (Index)',
                 line=dict(
                     width=2,
-                    color=series_colors[series_name],
-                    dash='dot' if view_type == 'Both' else 'solid'
+                    color=colors[i],
+                    dash=index_dash
                 )
             ))
     
     if view_type in ['Year-over-Year Changes', 'Both']:
         # Add year-over-year change
-        for series_name, df in df_dict.items():
-            yoy = calculate_yoy_change(df)
-            fig.add_trace(go.Scatter(
-                x=df.index,
+        yoy_axis = 'y2' if view_type == 'Both' else 'y'
+        for i, (series_name, yoy) in enumerate(yoy_df.items()):
+            traces.append(go.Scattergl(
+                x=yoy_df.index,
                 y=yoy,
                 name=f'{series_name} (YoY %)',
                 line=dict(
                     dash='solid',
                     width=2,
-                    color=series_colors[series_name]
+                    color=colors[i]
                 ),
-                yaxis='y2' if view_type == 'Both' else 'y'
+                yaxis=yoy_axis
             ))
     
+    # Unified hover gets slow with many points, fall back to closest point
+    total_points = sum(len(trace.x) for trace in traces)
+    
+    layout_kwargs = dict(
+        title='CPI Data',
+        xaxis_title='Date',
+        hovermode='x unified' if total_points < UNIFIED_HOVER_MAX_POINTS else 'closest',
+        height=600
+    )
+    
     if view_type == 'Both':
-        # Update layout for dual y-axes
-        fig.update_layout(
+        # Dual y-axes for index values and YoY changes
+        layout_kwargs.update(
             yaxis=dict(
                 title='Index Value'
             ),
@@ -112,18 +152,9 @@ def create_plot(df_dict, view_type):
             )
         )
     else:
-        fig.update_layout(
-            yaxis_title='Index Value' if view_type == 'Index Values' else 'Year-over-Year Change (%)'
-        )
+        layout_kwargs['yaxis_title'] = 'Index Value' if view_type == 'Index Values' else 'Year-over-Year Change (%)'
     
-    fig.update_layout(
-        title='CPI Data',
-        xaxis_title='Date',
-        hovermode='x unified',
-        height=600
-    )
-    
-    return fig
+    return go.Figure(data=traces, layout=go.Layout(**layout_kwargs))
 
 def get_url_params():
     """Get parameters from URL"""
@@ -131,7 +162,6 @@ def get_url_params():
         # Get parameters directly from Streamlit
         start_date_str = st.query_params.get('start_date', None)
         end_date_str = st.query_params.get('end_date', None)
-        series = st.query_params.get('series', [])
         view_type = st.query_params.get('view_type', 'Index Values')
         
         # Parse dates if they exist
@@ -139,13 +169,13 @@ def get_url_params():
         end_date = None
         if start_date_str and isinstance(start_date_str, str) and len(start_date_str) > 5:
             try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+                start_date = date.fromisoformat(start_date_str)
             except ValueError:
                 st.warning(f"Invalid start date format: {start_date_str}")
         
         if end_date_str and isinstance(end_date_str, str) and len(end_date_str) > 5:
             try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+                end_date = date.fromisoformat(end_date_str)
             except ValueError:
                 st.warning(f"Invalid end date format: {end_date_str}")
             
@@ -165,7 +195,7 @@ def get_url_params():
             valid_series = ['All Items', 'All Items Less Food and Energy']
             
         # Validate view type
-        if not isinstance(view_type, str) or view_type not in ['Index Values', 'Year-over-Year Changes', 'Both']:
+        if not isinstance(view_type, str) or view_type not in VIEW_INDEX:
             view_type = 'Index Values'
             
         return {
@@ -193,8 +223,8 @@ def generate_share_url(start_date, end_date, selected_series, view_type):
     
     # Prepare parameters
     params = {
-        'start_date': start_date.strftime('%Y-%m-%d'),
-        'end_date': end_date.strftime('%Y-%m-%d'),
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
         'series': selected_series,
         'view_type': view_type
     }
@@ -217,14 +247,14 @@ url_params = get_url_params()
 # Time period selection
 col1, col2 = st.columns(2)
 with col1:
-    default_start = url_params['start_date'] if url_params['start_date'] else datetime.now() - timedelta(days=365*5)
+    default_start = url_params['start_date'] if url_params['start_date'] else date.today() - timedelta(days=365*5)
     start_date = st.date_input(
         "Start Date",
         default_start,
-        min_value=datetime(1947, 1, 1)  # FRED CPI data starts from 1947
+        min_value=date(1947, 1, 1)  # FRED CPI data starts from 1947
     )
 with col2:
-    default_end = url_params['end_date'] if url_params['end_date'] else datetime.now()
+    default_end = url_params['end_date'] if url_params['end_date'] else date.today()
     end_date = st.date_input(
         "End Date",
         default_end,
@@ -235,7 +265,7 @@ with col2:
 default_series = url_params['series'] if url_params['series'] else ['All Items', 'All Items Less Food and Energy']
 selected_series = st.multiselect(
     'Select CPI Series',
-    list(CPI_SERIES.keys()),
+    CPI_SERIES_NAMES,
     default=default_series
 )
 
@@ -243,8 +273,8 @@ selected_series = st.multiselect(
 default_view = url_params['view_type']
 view_type = st.radio(
     'Select View Type',
-    ['Index Values', 'Year-over-Year Changes', 'Both'],
-    index=['Index Values', 'Year-over-Year Changes', 'Both'].index(default_view)
+    VIEW_TYPES,
+    index=VIEW_INDEX.get(default_view, 0)
 )
 
 # Share button
@@ -255,28 +285,31 @@ if st.button('Share Current View'):
 
 # Fetch and display data
 if selected_series:
-    df_dict = {}
-    for series_name in selected_series:
-        series_id = CPI_SERIES[series_name]
-        df = get_cpi_data(series_id, start_date, end_date)
-        if df is not None:
-            df_dict[series_name] = df
+    series_dict = get_cpi_data(selected_series, start_date, end_date)
     
-    if df_dict:
-        fig = create_plot(df_dict, view_type)
-        st.plotly_chart(fig, use_container_width=True)
+    if series_dict:
+        # Combine all series and compute YoY changes in a single pass,
+        # only when the selected view needs them
+        combined_df = pd.concat(series_dict, axis=1)
+        yoy_df = None
+        if view_type in ['Year-over-Year Changes', 'Both']:
+            yoy_df = calculate_yoy_change(combined_df)
+        
+        fig = create_plot(combined_df, yoy_df, view_type)
+        st.plotly_chart(
+            fig,
+            use_container_width=True,
+            config={'scrollZoom': True, 'doubleClick': 'reset'}
+        )
         
         # Display raw data
         if st.checkbox('Show Raw Data'):
-            # Combine all dataframes
-            combined_df = pd.concat([df for df in df_dict.values()], axis=1)
-            combined_df.columns = [name for name in df_dict.keys()]
-            
             # Add YoY changes if requested
-            if view_type in ['Year-over-Year Changes', 'Both']:
-                yoy_df = pd.DataFrame()
-                for series_name, df in df_dict.items():
-                    yoy_df[f'{series_name} (YoY %)'] = calculate_yoy_change(df)
-                combined_df = pd.concat([combined_df, yoy_df], axis=1)
+            raw_df = combined_df
+            if yoy_df is not None:
+                raw_df = pd.concat({
+                    **series_dict,
+                    **{f'{series_name} (YoY %)': yoy for series_name, yoy in yoy_df.items()}
+                }, axis=1)
             
-            st.dataframe(combined_df) 
\ No newline at end of file
+            st.dataframe(raw_df) 
\ No newline at end of file